@@ -13,4 +13,19 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'video.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# has to be imported after Django is set up
+from django.urls import reverse
+from video_collection.events import video_events_app
+
+VIDEO_EVENTS_PATH = reverse('video_events')
+
+
+async def application(scope, receive, send):
+    # the live list updates are long lived streams, so they skip Django entirely.
+    # EventSource only ever sends GET, anything else is Django's problem
+    if scope['type'] == 'http' and scope['method'] == 'GET' and scope['path'] == VIDEO_EVENTS_PATH:
+        await video_events_app(scope, receive, send)
+    else:
+        await django_application(scope, receive, send)
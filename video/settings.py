@@ -37,7 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'video_collection'
+    'video_collection.apps.VideoCollectionConfig'
 ]
 
 MIDDLEWARE = [
@@ -48,6 +48,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'video_collection.profiling.ProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'video.urls'
@@ -70,6 +71,8 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'video.wsgi.application'
 
+TEST_RUNNER = 'video.test_runner.TestRunner'
+
 
 # Database
 # https://docs.djangoproject.com/en/3.0/ref/settings/#databases
@@ -119,3 +122,41 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.0/howto/static-files/
 
 STATIC_URL = '/static/'
+
+
+# Pre-rendered video list for anonymous users, rebuilt after Video changes.
+# Set VIDEO_SNAPSHOT_DIR to None to always render the list live.
+
+VIDEO_SNAPSHOT_DIR = os.path.join(BASE_DIR, 'snapshots')
+
+VIDEO_SNAPSHOT_DEBOUNCE = 2  # seconds to wait after the last write before rebuilding
+
+VIDEO_SNAPSHOT_MAX_WAIT = 10  # seconds, a steady stream of writes can't delay a rebuild longer
+
+VIDEO_SNAPSHOT_MAX_AGE = 60 * 60  # seconds, older snapshots are ignored
+
+
+# Per-request profiling, see video_collection/profiling.py. When PROFILER_ENABLED
+# is False the middleware removes itself. Profiles are listed at /admin/profiles/
+
+PROFILER_ENABLED = False
+
+PROFILER_DIR = os.path.join(BASE_DIR, 'profiles')
+
+PROFILER_KEEP = 50  # newest profiles kept on disk
+
+PROFILER_TOKEN_MAX_AGE = 60 * 60  # seconds a signed ?profile= link works for
+
+
+# Local thumbnail cache, see video_collection/thumbnails.py. Swap the upstream for
+# 'video_collection.thumbnails.placeholder_upstream' to work without network access.
+
+THUMBNAIL_UPSTREAM = 'video_collection.thumbnails.youtube_upstream'
+
+THUMBNAIL_CACHE_DIR = os.path.join(BASE_DIR, 'thumbnails')
+
+THUMBNAIL_CACHE_MAX_BYTES = 50 * 1024 * 1024  # least recently used thumbnails deleted past this
+
+THUMBNAIL_WIDTH = 320  # pixels, needs Pillow installed to resize
+
+THUMBNAIL_FAILURE_TTL = 60  # seconds before retrying a thumbnail upstream couldn't fetch
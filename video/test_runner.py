@@ -0,0 +1,19 @@
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    # tests must never read or delete the real pre-rendered video list, so the
+    # whole run gets its own empty snapshot directory
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.snapshot_dir = tempfile.TemporaryDirectory()
+        self.snapshot_override = override_settings(VIDEO_SNAPSHOT_DIR=self.snapshot_dir.name)
+        self.snapshot_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.snapshot_override.disable()
+        self.snapshot_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
@@ -15,8 +15,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from video_collection import views
 
 urlpatterns = [
+    # has to come before the admin site, which would catch these urls
+    path('admin/profiles/', views.profiles, name='profiles'),
+    path('admin/profiles/<str:name>', views.profile_download, name='profile_download'),
     path('admin/', admin.site.urls),
     path('', include('video_collection.urls'))
 ]
@@ -1,6 +1,13 @@
 from django.contrib import admin
-from .models import Video
+from .models import Video, Tag
 
 # Register your models here.
 
-admin.site.register(Video)
\ No newline at end of file
+class VideoAdmin(admin.ModelAdmin):
+    filter_horizontal = ['tags']
+
+class TagAdmin(admin.ModelAdmin):
+    list_display = ['name', 'video_count']
+
+admin.site.register(Video, VideoAdmin)
+admin.site.register(Tag, TagAdmin)
@@ -3,3 +3,19 @@ from django.apps import AppConfig
 
 class VideoCollectionConfig(AppConfig):
     name = 'video_collection'
+
+    def ready(self):
+        from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+        from . import events, snapshot, tags
+        from .models import Video, Tag
+
+        post_save.connect(snapshot.video_changed, sender=Video, dispatch_uid='video_snapshot_save')
+        post_delete.connect(snapshot.video_changed, sender=Video, dispatch_uid='video_snapshot_delete')
+        # tag names and counts are on the list page too
+        m2m_changed.connect(snapshot.video_changed, sender=Video.tags.through, dispatch_uid='video_snapshot_tags')
+        post_save.connect(snapshot.video_changed, sender=Tag, dispatch_uid='video_snapshot_tag_save')
+        post_delete.connect(snapshot.video_changed, sender=Tag, dispatch_uid='video_snapshot_tag_delete')
+        m2m_changed.connect(tags.video_tags_changed, sender=Video.tags.through, dispatch_uid='video_tag_counts')
+        pre_delete.connect(tags.video_deleted, sender=Video, dispatch_uid='video_tag_counts_delete')
+        post_save.connect(events.video_saved, sender=Video, dispatch_uid='video_events_save')
+        post_delete.connect(events.video_deleted, sender=Video, dispatch_uid='video_events_delete')
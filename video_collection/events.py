@@ -0,0 +1,116 @@
+import asyncio
+import json
+import threading
+
+from django.db import transaction
+
+from .snapshot import video_to_dict
+
+# Server-Sent Events for the video list. Django 3 can't stream from an async view,
+# so the events endpoint is a tiny plain ASGI app that video/asgi.py sends requests
+# to before they reach Django. Every open connection is just a coroutine sleeping on
+# its own queue, the broadcaster below drops new events into all of them.
+
+KEEPALIVE_SECONDS = 15  # comment line so proxies don't close idle connections
+QUEUE_SIZE = 100  # a client this far behind gets disconnected and reconnects
+
+
+class Broadcaster:
+
+    def __init__(self):
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        subscriber = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def publish(self, event, data):
+        # called from whatever thread saved the video, so hand the message to each
+        # subscriber's event loop instead of touching the queues from here
+        message = f'event: {event}\ndata: {json.dumps(data)}\n\n'.encode('utf-8')
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_put, queue, message)
+            except RuntimeError:
+                # loop already closed
+                self.unsubscribe((loop, queue))
+
+
+def _put(queue, message):
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        # None tells the connection to close, the browser will reconnect
+        queue.get_nowait()
+        queue.put_nowait(None)
+
+
+broadcaster = Broadcaster()
+
+
+def video_saved(sender, instance, created, **kwargs):
+    if created:
+        # built after commit, the add form saves the tags after the video itself
+        transaction.on_commit(lambda: broadcaster.publish('added', video_to_dict(instance)))
+
+
+def video_deleted(sender, instance, **kwargs):
+    data = {'id': instance.pk}
+    transaction.on_commit(lambda: broadcaster.publish('deleted', data))
+
+
+async def video_events_app(scope, receive, send):
+    subscriber = broadcaster.subscribe()
+    loop, queue = subscriber
+    try:
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+
+        disconnected = loop.create_task(_wait_for_disconnect(receive))
+        try:
+            while True:
+                next_message = loop.create_task(queue.get())
+                done, _ = await asyncio.wait(
+                    {next_message, disconnected}, timeout=KEEPALIVE_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+                if disconnected in done:
+                    next_message.cancel()
+                    return
+                if next_message not in done:
+                    next_message.cancel()
+                    await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+                    continue
+                message = next_message.result()
+                if message is None:
+                    break
+                await send({'type': 'http.response.body', 'body': message, 'more_body': True})
+        finally:
+            disconnected.cancel()
+        # we're the ones hanging up (client fell too far behind)
+        await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        broadcaster.unsubscribe(subscriber)
+
+
+async def _wait_for_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
@@ -0,0 +1,28 @@
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Snapshots, thumbnails and profiles are all written next to readers serving
+# them, so they go to a temp file in the same directory first and get renamed
+# into place. A reader sees the old file or the new one, never half of one.
+
+
+@contextmanager
+def atomic_file(path):
+    # yields a temp path to write to, which replaces path if the block succeeds
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+    os.close(fd)
+    try:
+        yield temp_path
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def write_atomic(path, data):
+    with atomic_file(path) as temp_path:
+        with open(temp_path, 'wb') as temp_file:
+            temp_file.write(data)
@@ -1,10 +1,34 @@
 from django import forms
 from .models import Video
+from .tags import tag_sidebar
 
 class VideoForm(forms.ModelForm):
     class Meta:
         model = Video
-        fields = ['name', 'url', 'notes']
+        fields = ['name', 'url', 'notes', 'tags']
+        widgets = {'tags': forms.CheckboxSelectMultiple}
+
+def tag_choices():
+    # only tags that are on some video, the same ones as the sidebar
+    return [ (tag.name, tag.name) for tag in tag_sidebar() ]
+
+class TagNamesField(forms.MultipleChoiceField):
+    # the tags a search is filtered by. Any name is accepted, not just the ones shown
+    # as checkboxes, so an unknown tag (old link, typo) matches no videos instead of
+    # making the whole search invalid
+
+    def to_python(self, value):
+        names = super().to_python(value)
+        return [ name for name in dict.fromkeys(names) if name ]
+
+    def valid_value(self, value):
+        return True
 
 class SearchForm(forms.Form):
-    search_term = forms.CharField()
\ No newline at end of file
+    search_term = forms.CharField(required=False)
+    # tags go in the url by name, ?tags=music&tags=live
+    tags = TagNamesField(choices=tag_choices, required=False, widget=forms.CheckboxSelectMultiple)
+    match = forms.ChoiceField(choices=[('all', 'All tags'), ('any', 'Any tag')], required=False, widget=forms.RadioSelect)
+
+    def clean_match(self):
+        return self.cleaned_data['match'] or 'all'
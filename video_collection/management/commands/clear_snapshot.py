@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from video_collection import snapshot
+
+
+class Command(BaseCommand):
+    help = ('Delete the pre-rendered video list, e.g. after a deploy or loaddata. '
+            'It gets rebuilt on the next request for the list.')
+
+    def handle(self, *args, **options):
+        if not snapshot.snapshot_dir():
+            self.stdout.write('VIDEO_SNAPSHOT_DIR is not set, nothing to clear')
+            return
+        snapshot.invalidate_snapshot()
+        self.stdout.write(f'Cleared the video list snapshot in {snapshot.snapshot_dir()}')
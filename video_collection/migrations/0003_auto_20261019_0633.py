@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-19 06:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('video_collection', '0002_video_video_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('video_count', models.PositiveIntegerField(default=0, editable=False)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='video',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='videos', to='video_collection.Tag'),
+        ),
+    ]
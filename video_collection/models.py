@@ -4,11 +4,21 @@ from django.core.exceptions import ValidationError
 
 # Create your models here.
 
+class Tag(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    # kept up to date by the signal handlers in tags.py, so the list page can show
+    # counts without counting every time
+    video_count = models.PositiveIntegerField(default=0, editable=False)
+
+    def __str__(self):
+        return self.name
+
 class Video(models.Model):
     name = models.CharField(max_length=200)
     url = models.CharField(max_length=400)
     notes = models.TextField(blank=True, null=True)
     video_id = models.CharField(max_length=40, unique=True)
+    tags = models.ManyToManyField(Tag, blank=True, related_name='videos')
 
     def save(self, *args, **kwargs):
         # checks for valid youtube url in form
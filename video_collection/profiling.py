@@ -0,0 +1,113 @@
+import cProfile
+import logging
+import os
+import re
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+from .files import atomic_file
+
+# Opt-in profiling for single slow requests. Staff users add ?profile=1 to a url,
+# anyone else needs a signed ?profile=<token> link from the profiles admin page.
+# The request runs under cProfile and the stats get saved in PROFILER_DIR, which
+# only keeps the newest PROFILER_KEEP files. Open them with pstats or snakeviz.
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PARAMETER = 'profile'
+SIGNING_SALT = 'video_collection.profiling'
+
+# 20201121-100400-123456_153ms_GET_video_list.prof
+PROFILE_NAME = re.compile(r'^(?P<time>\d{8}-\d{6}-\d{6})_(?P<ms>\d+)ms_(?P<method>[A-Z]+)_(?P<path>[\w.-]*)\.prof$')
+
+
+def profile_dir():
+    return getattr(settings, 'PROFILER_DIR', os.path.join(settings.BASE_DIR, 'profiles'))
+
+
+def make_profile_token():
+    return signing.dumps(PROFILE_PARAMETER, salt=SIGNING_SALT)
+
+
+def valid_profile_token(token):
+    try:
+        signing.loads(token, salt=SIGNING_SALT, max_age=getattr(settings, 'PROFILER_TOKEN_MAX_AGE', 60 * 60))
+        return True
+    except signing.BadSignature:
+        return False
+
+
+def should_profile(request):
+    token = request.GET.get(PROFILE_PARAMETER)
+    if token is None:
+        return False
+    return request.user.is_staff or valid_profile_token(token)
+
+
+def save_profile(profiler, request, duration):
+    directory = profile_dir()
+    path_slug = re.sub(r'[^\w.-]+', '_', request.path).strip('_')
+    name = f'{datetime.now():%Y%m%d-%H%M%S-%f}_{int(duration * 1000)}ms_{request.method}_{path_slug}.prof'
+
+    with atomic_file(os.path.join(directory, name)) as temp_path:
+        profiler.dump_stats(temp_path)
+
+    # ring buffer, drop the oldest once there are too many
+    for old_profile in list_profiles()[getattr(settings, 'PROFILER_KEEP', 50):]:
+        try:
+            os.remove(os.path.join(directory, old_profile['name']))
+        except FileNotFoundError:
+            pass
+    return name
+
+
+def list_profiles():
+    # newest first
+    try:
+        names = os.listdir(profile_dir())
+    except FileNotFoundError:
+        return []
+
+    profiles = []
+    for name in names:
+        match = PROFILE_NAME.match(name)
+        if match:
+            profiles.append({
+                'name': name,
+                'time': datetime.strptime(match.group('time'), '%Y%m%d-%H%M%S-%f'),
+                'ms': int(match.group('ms')),
+                'method': match.group('method'),
+                'path': '/' + match.group('path'),
+            })
+    profiles.sort(key=lambda profile: profile['name'], reverse=True)
+    return profiles
+
+
+class ProfilerMiddleware:
+
+    def __init__(self, get_response):
+        # when it's off Django drops the middleware completely, so it costs nothing
+        if not getattr(settings, 'PROFILER_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not should_profile(request):
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        start = time.perf_counter()
+        response = profiler.runcall(self.get_response, request)
+        duration = time.perf_counter() - start
+        # a broken profiler (full disk, bad PROFILER_DIR) mustn't break the request it measured
+        try:
+            name = save_profile(profiler, request, duration)
+        except Exception:
+            logger.exception('Could not save profile for %s %s', request.method, request.path)
+            return response
+        response['X-Profile'] = name
+        return response
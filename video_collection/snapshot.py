@@ -0,0 +1,157 @@
+import json
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.functions import Lower
+from django.http import FileResponse
+from django.template.loader import render_to_string
+
+from .files import write_atomic
+from .forms import SearchForm
+from .models import Video
+from .tags import tag_sidebar
+
+# The video list barely changes but anonymous users hit it all the time, so after
+# every Video write we render the list page (and a JSON dump) once to static files
+# and hand those straight to the server with FileResponse. No query, no template.
+# If the files are missing or too old the views just fall back to the live version.
+
+LIST_PAGE = 'video_list.html'
+LIST_JSON = 'video_list.json'
+
+# sent with each snapshot, the same as the live views would send
+CONTENT_TYPES = {
+    LIST_PAGE: 'text/html; charset=utf-8',
+    LIST_JSON: 'application/json',
+}
+
+_timer = None
+_burst_started = 0
+_timer_lock = threading.Lock()
+
+
+def snapshot_dir():
+    # None turns the whole thing off
+    return getattr(settings, 'VIDEO_SNAPSHOT_DIR', None)
+
+
+def snapshot_path(name):
+    return os.path.join(snapshot_dir(), name)
+
+
+def video_to_dict(video):
+    return {
+        'id': video.pk,
+        'name': video.name,
+        'url': video.url,
+        'notes': video.notes,
+        'video_id': video.video_id,
+        'tags': [ tag.name for tag in video.tags.all() ],
+    }
+
+
+def build_snapshot():
+    if not snapshot_dir():
+        return
+    videos = list(Video.objects.order_by(Lower('name')).prefetch_related('tags'))
+    page = render_to_string('video_collection/video_list.html',
+        {'videos': videos, 'search_form': SearchForm(), 'tag_sidebar': tag_sidebar()})
+    data = json.dumps({'videos': [video_to_dict(video) for video in videos]})
+    # json first, the html page is the one checked most often
+    write_atomic(snapshot_path(LIST_JSON), data.encode('utf-8'))
+    write_atomic(snapshot_path(LIST_PAGE), page.encode('utf-8'))
+
+
+def invalidate_snapshot():
+    if not snapshot_dir():
+        return
+    for name in (LIST_PAGE, LIST_JSON):
+        try:
+            os.remove(snapshot_path(name))
+        except FileNotFoundError:
+            pass
+
+
+def _run_rebuild():
+    global _timer
+    with _timer_lock:
+        _timer = None
+    try:
+        build_snapshot()
+    finally:
+        # this runs in its own thread, which gets its own db connection
+        connection.close()
+
+
+def _start_timer(delay):
+    # call with _timer_lock held
+    global _timer
+    _timer = threading.Timer(delay, _run_rebuild)
+    _timer.daemon = True
+    _timer.start()
+
+
+def schedule_rebuild():
+    # for writes - debounced, so a burst of writes only rebuilds once things go quiet,
+    # but never put off longer than VIDEO_SNAPSHOT_MAX_WAIT after the first one
+    global _burst_started
+    if not snapshot_dir():
+        return
+    debounce = getattr(settings, 'VIDEO_SNAPSHOT_DEBOUNCE', 2)
+    max_wait = getattr(settings, 'VIDEO_SNAPSHOT_MAX_WAIT', 10)
+    now = time.monotonic()
+    with _timer_lock:
+        if _timer is None:
+            _burst_started = now
+        else:
+            _timer.cancel()
+        _start_timer(max(0, min(debounce, _burst_started + max_wait - now)))
+
+
+def request_rebuild():
+    # for reads that found no usable snapshot. Only starts a rebuild if none is
+    # pending, and never pushes a pending one back, otherwise steady traffic would
+    # keep resetting the timer and the snapshot would never get built
+    global _burst_started
+    if not snapshot_dir():
+        return
+    with _timer_lock:
+        if _timer is None:
+            _burst_started = time.monotonic()
+            _start_timer(getattr(settings, 'VIDEO_SNAPSHOT_DEBOUNCE', 2))
+
+
+def video_changed(sender, **kwargs):
+    # only touch the files once the write is actually committed
+    transaction.on_commit(_invalidate_and_rebuild)
+
+
+def _invalidate_and_rebuild():
+    invalidate_snapshot()
+    schedule_rebuild()
+
+
+def serve_snapshot(name):
+    # returns a FileResponse for a fresh snapshot, or None if the caller should build the live page
+    if not snapshot_dir():
+        return None
+    try:
+        snapshot_file = open(snapshot_path(name), 'rb')
+    except FileNotFoundError:
+        transaction.on_commit(request_rebuild)
+        return None
+
+    max_age = getattr(settings, 'VIDEO_SNAPSHOT_MAX_AGE', None)
+    if max_age is not None and time.time() - os.fstat(snapshot_file.fileno()).st_mtime > max_age:
+        snapshot_file.close()
+        transaction.on_commit(request_rebuild)
+        return None
+
+    response = FileResponse(snapshot_file)
+    # set afterwards, FileResponse replaces a text/html content_type argument with
+    # its guess from the file name, which has no charset
+    response['Content-Type'] = CONTENT_TYPES[name]
+    return response
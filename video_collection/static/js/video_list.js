@@ -0,0 +1,99 @@
+// Keeps the video list up to date while the page is open. The server pushes
+// 'added' and 'deleted' events, and this patches the list instead of reloading.
+
+(function () {
+    var list = document.getElementById('videos');
+    if (!list || !window.EventSource) {
+        return;
+    }
+
+    var searchTerm = list.dataset.searchTerm.toLowerCase();
+    var params = new URLSearchParams(window.location.search);
+    var filterTags = params.getAll('tags');
+    var matchAny = params.get('match') === 'any';
+    var events = new EventSource(list.dataset.eventsUrl);
+
+    function videoDivs() {
+        return list.querySelectorAll('div[data-id]');
+    }
+
+    function updateCount() {
+        var count = videoDivs().length;
+        document.getElementById('video_count').textContent = count + ' video' + (count === 1 ? '' : 's');
+
+        var noVideos = document.getElementById('no_videos');
+        if (count === 0 && !noVideos) {
+            noVideos = document.createElement('h3');
+            noVideos.id = 'no_videos';
+            noVideos.textContent = 'No videos';
+            list.appendChild(noVideos);
+        } else if (count > 0 && noVideos) {
+            noVideos.remove();
+        }
+    }
+
+    function textElement(tag, text) {
+        var element = document.createElement(tag);
+        element.textContent = text;
+        return element;
+    }
+
+    events.addEventListener('added', function (event) {
+        var video = JSON.parse(event.data);
+        // same tag filter as the server, every tag or (with match=any) at least one
+        if (filterTags.length) {
+            var hasTag = function (tag) { return video.tags.indexOf(tag) !== -1; };
+            if (!(matchAny ? filterTags.some(hasTag) : filterTags.every(hasTag))) {
+                return;
+            }
+        }
+        // same rule as the search on the server, partial match ignoring case
+        if (searchTerm && video.name.toLowerCase().indexOf(searchTerm) === -1) {
+            return;
+        }
+        if (list.querySelector('div[data-id="' + video.id + '"]')) {
+            return;
+        }
+
+        var div = document.createElement('div');
+        div.id = 'video_list';
+        div.dataset.id = video.id;
+        div.dataset.name = video.name;
+        div.appendChild(textElement('h3', video.name));
+        div.appendChild(textElement('p', video.notes || ''));
+        div.appendChild(textElement('p', video.url));
+        if (video.tags.length) {
+            var tags = document.createElement('p');
+            tags.className = 'tags';
+            video.tags.forEach(function (tag) {
+                var link = textElement('a', tag);
+                link.href = list.dataset.listUrl + '?tags=' + encodeURIComponent(tag);
+                tags.appendChild(link);
+                tags.appendChild(document.createTextNode(' '));
+            });
+            div.appendChild(tags);
+        }
+        var iframe = document.createElement('iframe');
+        iframe.width = 420;
+        iframe.height = 315;
+        iframe.src = 'https://youtube.com/embed/' + encodeURIComponent(video.video_id);
+        div.appendChild(iframe);
+
+        // keep the list sorted by name, ignoring case
+        var name = video.name.toLowerCase();
+        var before = Array.prototype.find.call(videoDivs(), function (other) {
+            return other.dataset.name.toLowerCase() > name;
+        });
+        list.insertBefore(div, before || null);
+        updateCount();
+    });
+
+    events.addEventListener('deleted', function (event) {
+        var video = JSON.parse(event.data);
+        var div = list.querySelector('div[data-id="' + video.id + '"]');
+        if (div) {
+            div.remove();
+            updateCount();
+        }
+    });
+})();
@@ -0,0 +1,42 @@
+from django.db.models import F
+
+from .models import Tag
+
+# Tag.video_count is a plain column, updated here whenever videos and tags get
+# linked or unlinked, so the tag sidebar never has to count the join table.
+# Tags can be changed from either side (video.tags.add(tag) or tag.videos.add(video))
+# and m2m_changed tells us which one with reverse.
+
+
+def _change_counts(tag_pks, change):
+    if tag_pks:
+        Tag.objects.filter(pk__in=tag_pks).update(video_count=F('video_count') + change)
+
+
+def video_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        # instance is a Video, pk_set are tags. Django leaves out tags the video
+        # already had on add and ones it didn't have on remove, so these are real changes
+        if action == 'post_add':
+            _change_counts(pk_set, 1)
+        elif action == 'post_remove':
+            _change_counts(pk_set, -1)
+        elif action == 'pre_clear':
+            _change_counts(list(instance.tags.values_list('pk', flat=True)), -1)
+    else:
+        # instance is a Tag, pk_set are videos
+        if action == 'post_add':
+            Tag.objects.filter(pk=instance.pk).update(video_count=F('video_count') + len(pk_set))
+        elif action == 'post_remove':
+            Tag.objects.filter(pk=instance.pk).update(video_count=F('video_count') - len(pk_set))
+        elif action == 'pre_clear':
+            Tag.objects.filter(pk=instance.pk).update(video_count=0)
+
+
+def video_deleted(sender, instance, **kwargs):
+    # deleting a video removes its join rows without sending m2m_changed
+    _change_counts(list(instance.tags.values_list('pk', flat=True)), -1)
+
+
+def tag_sidebar():
+    return Tag.objects.filter(video_count__gt=0).order_by('name')
@@ -1,9 +1,23 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import threading
+import time
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
 from django.urls import reverse
-from django.core.exceptions import ValidationError
-from django.db import IntegrityError, transaction
+from django.apps import apps
+from django.core.management import call_command
+from django.contrib.auth.models import User
+from django.core.exceptions import MiddlewareNotUsed, ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.test.utils import CaptureQueriesContext
 
-from .models import Video
+from .models import Video, Tag
+from . import events, files, profiling, snapshot, thumbnails
 
 class TestHomePageMessage(TestCase):
 
@@ -387,4 +401,612 @@ class TestVideoModel(TestCase):
         with self.assertRaises(IntegrityError):
             Video.objects.create(name='example', url='https://www.youtube.com/watch?v=IODxDxX7oi4')
 
-        
\ No newline at end of file
+        
+
+
+class TempDirSettingsMixin:
+
+    def use_temp_dir(self, setting, **other_settings):
+        # points a directory setting at an empty temp directory for this test only,
+        # along with any other settings given. Returns the directory
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        settings_override = override_settings(**{setting: temp_dir.name}, **other_settings)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        return temp_dir.name
+
+
+class TestAtomicFiles(SimpleTestCase):
+
+    def test_failed_write_keeps_old_file_and_no_temp_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'example.txt')
+            files.write_atomic(path, b'old')
+            with self.assertRaises(RuntimeError):
+                with files.atomic_file(path) as temp_path:
+                    with open(temp_path, 'wb') as temp_file:
+                        temp_file.write(b'half')
+                    raise RuntimeError('disk full')
+            with open(path, 'rb') as example:
+                self.assertEqual(b'old', example.read())
+            self.assertEqual(['example.txt'], os.listdir(directory))
+
+
+class TestVideoListSnapshot(TempDirSettingsMixin, TestCase):
+
+    def setUp(self):
+        self.snapshot_dir = self.use_temp_dir('VIDEO_SNAPSHOT_DIR', VIDEO_SNAPSHOT_MAX_AGE=None)
+        self.addCleanup(self.cancel_pending_rebuild)
+
+        Video.objects.create(name='XYZ', notes='example', url='https://www.youtube.com/watch?v=123')
+        Video.objects.create(name='ABC', notes='example', url='https://www.youtube.com/watch?v=456')
+
+
+    def cancel_pending_rebuild(self):
+        # don't let a timer from one test rebuild into another test's database
+        with snapshot._timer_lock:
+            if snapshot._timer is not None:
+                snapshot._timer.cancel()
+                snapshot._timer = None
+
+
+    def test_build_writes_page_and_json(self):
+        snapshot.build_snapshot()
+        with open(os.path.join(self.snapshot_dir, snapshot.LIST_PAGE)) as page:
+            self.assertIn('2 videos', page.read())
+        with open(os.path.join(self.snapshot_dir, snapshot.LIST_JSON)) as data:
+            names = [ video['name'] for video in json.load(data)['videos'] ]
+        self.assertEqual(['ABC', 'XYZ'], names)
+        # no temp files left behind
+        self.assertCountEqual([snapshot.LIST_PAGE, snapshot.LIST_JSON], os.listdir(self.snapshot_dir))
+
+
+    def test_anonymous_list_served_from_snapshot(self):
+        Video.objects.create(name='Café ☂️', url='https://www.youtube.com/watch?v=555')
+        snapshot.build_snapshot()
+        # a video added directly to the db isn't in the snapshot yet, proves the file was used
+        Video.objects.create(name='new one', url='https://www.youtube.com/watch?v=789')
+        response = self.client.get(reverse('video_list'))
+        self.assertTrue(response.streaming)
+        # same as the live page, or browsers guess the encoding and mangle the name
+        self.assertEqual('text/html; charset=utf-8', response['Content-Type'])
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertIn('3 videos', content)
+        self.assertIn('Café ☂️', content)
+        self.assertNotIn('new one', content)
+
+
+    def test_missing_snapshot_falls_back_to_live_list(self):
+        snapshot.build_snapshot()
+        snapshot.invalidate_snapshot()
+        response = self.client.get(reverse('video_list'))
+        self.assertEqual(2, len(response.context['videos']))
+        self.assertContains(response, '2 videos')
+
+
+    def test_snapshot_survives_app_reload(self):
+        # starting a worker (or running manage.py anything) mustn't wipe the snapshot
+        snapshot.build_snapshot()
+        apps.get_app_config('video_collection').ready()
+        self.assertTrue(os.path.exists(os.path.join(self.snapshot_dir, snapshot.LIST_PAGE)))
+
+
+    def test_clear_snapshot_command(self):
+        snapshot.build_snapshot()
+        call_command('clear_snapshot', stdout=io.StringIO())
+        self.assertEqual([], os.listdir(self.snapshot_dir))
+
+
+    @override_settings(VIDEO_SNAPSHOT_MAX_AGE=0)
+    def test_stale_snapshot_falls_back_to_live_list(self):
+        snapshot.build_snapshot()
+        old = os.path.getmtime(os.path.join(self.snapshot_dir, snapshot.LIST_PAGE)) - 10
+        os.utime(os.path.join(self.snapshot_dir, snapshot.LIST_PAGE), (old, old))
+        response = self.client.get(reverse('video_list'))
+        self.assertEqual(2, len(response.context['videos']))
+
+
+    def test_search_and_logged_in_users_get_live_list(self):
+        snapshot.build_snapshot()
+        response = self.client.get(reverse('video_list') + '?search_term=abc')
+        self.assertEqual(1, len(response.context['videos']))
+
+        user = User.objects.create_user(username='someone', password='password')
+        self.client.force_login(user)
+        response = self.client.get(reverse('video_list'))
+        self.assertEqual(2, len(response.context['videos']))
+
+
+    def test_json_served_from_snapshot_or_live(self):
+        response = self.client.get(reverse('video_list_json'))
+        self.assertEqual(['ABC', 'XYZ'], [ video['name'] for video in response.json()['videos'] ])
+
+        snapshot.build_snapshot()
+        response = self.client.get(reverse('video_list_json'))
+        self.assertTrue(response.streaming)
+        self.assertEqual('application/json', response['Content-Type'])
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(['ABC', 'XYZ'], [ video['name'] for video in data['videos'] ])
+
+
+    @override_settings(VIDEO_SNAPSHOT_DEBOUNCE=0.1)
+    def test_steady_misses_still_rebuild(self):
+        # anonymous requests keep missing the snapshot every 20ms, which is faster
+        # than the debounce. The first miss starts a rebuild and the rest must not
+        # keep pushing it back
+        with mock.patch('video_collection.snapshot.build_snapshot') as build:
+            for i in range(25):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.assertIsNone(snapshot.serve_snapshot(snapshot.LIST_PAGE))
+                time.sleep(0.02)
+            self.assertGreaterEqual(build.call_count, 1)
+
+
+    @override_settings(VIDEO_SNAPSHOT_DEBOUNCE=0.1, VIDEO_SNAPSHOT_MAX_WAIT=0.2)
+    def test_steady_writes_rebuild_after_max_wait(self):
+        with mock.patch('video_collection.snapshot.build_snapshot') as build:
+            for i in range(25):
+                snapshot.schedule_rebuild()
+                time.sleep(0.02)
+            self.assertGreaterEqual(build.call_count, 1)
+
+
+class TestVideoEvents(SimpleTestCase):
+
+    def run_events_app(self, publish):
+        # pretend to be an ASGI server: collect everything sent, and disconnect once
+        # the published event has arrived
+        sent = []
+
+        async def run():
+            disconnect = asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+                if len(sent) == 2:
+                    # connection is open, publish from another thread like a view would
+                    threading.Thread(target=publish).start()
+                elif len(sent) == 3:
+                    disconnect.set()
+
+            await asyncio.wait_for(events.video_events_app({'type': 'http'}, receive, send), timeout=5)
+
+        asyncio.run(run())
+        return sent
+
+
+    def test_published_event_sent_to_client(self):
+        sent = self.run_events_app(lambda: events.broadcaster.publish('added', {'id': 1, 'name': 'test'}))
+
+        self.assertEqual(200, sent[0]['status'])
+        self.assertIn((b'content-type', b'text/event-stream'), sent[0]['headers'])
+        self.assertEqual(b'event: added\ndata: {"id": 1, "name": "test"}\n\n', sent[2]['body'])
+        # client went away, so no more subscribers hanging around
+        self.assertEqual(0, len(events.broadcaster._subscribers))
+
+
+    def test_client_too_far_behind_is_disconnected(self):
+        async def run():
+            subscriber = events.broadcaster.subscribe()
+            for i in range(events.QUEUE_SIZE + 1):
+                events.broadcaster.publish('deleted', {'id': i})
+            await asyncio.sleep(0)  # let the queued puts run
+            events.broadcaster.unsubscribe(subscriber)
+            return subscriber[1]
+
+        queue = asyncio.run(run())
+        self.assertEqual(events.QUEUE_SIZE, queue.qsize())
+        # last thing in the queue is the signal to hang up
+        messages = [ queue.get_nowait() for i in range(queue.qsize()) ]
+        self.assertIsNone(messages[-1])
+
+
+    def run_asgi(self, method, path):
+        # one request through the real ASGI entry point, returns the start message and body
+        from video.asgi import application
+        sent = []
+
+        async def run():
+            requested = False
+
+            async def receive():
+                nonlocal requested
+                if not requested:
+                    requested = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # the event stream waits for this, so hang up once it has started
+                while not any(message['type'] == 'http.response.body' for message in sent):
+                    await asyncio.sleep(0.01)
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                sent.append(message)
+
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+                'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'root_path': '', 'query_string': b'',
+                'headers': [(b'host', b'testserver')], 'client': ('127.0.0.1', 1234), 'server': ('testserver', 80),
+            }
+            await asyncio.wait_for(application(scope, receive, send), timeout=5)
+
+        asyncio.run(run())
+        start = sent[0]
+        body = b''.join(message.get('body', b'') for message in sent[1:])
+        return start, dict(start['headers']), body
+
+
+    def test_asgi_routes_events_url_to_event_stream(self):
+        start, headers, body = self.run_asgi('GET', reverse('video_events'))
+        self.assertEqual(200, start['status'])
+        self.assertEqual(b'text/event-stream', headers[b'content-type'])
+        self.assertTrue(body.startswith(b'retry:'))
+
+
+    def test_asgi_sends_other_paths_to_django(self):
+        start, headers, body = self.run_asgi('GET', reverse('home'))
+        self.assertEqual(200, start['status'])
+        self.assertIn(b'collection', body)
+
+
+    def test_asgi_sends_other_methods_on_events_url_to_django(self):
+        start, headers, body = self.run_asgi('POST', reverse('video_events'))
+        self.assertNotEqual(b'text/event-stream', headers.get(b'content-type'))
+        self.assertEqual(403, start['status'])  # Django's CSRF check, not the stream
+
+
+    def test_wsgi_events_url_tells_browser_to_stop(self):
+        response = self.client.get(reverse('video_events'))
+        self.assertEqual(204, response.status_code)
+
+
+class TestRequestProfiler(TempDirSettingsMixin, TestCase):
+
+    def setUp(self):
+        self.profile_dir = self.use_temp_dir('PROFILER_DIR', PROFILER_ENABLED=True, PROFILER_KEEP=3)
+        self.staff_user = User.objects.create_user(username='admin', password='password', is_staff=True)
+
+
+    def test_no_profile_without_parameter(self):
+        self.client.force_login(self.staff_user)
+        response = self.client.get(reverse('video_list'))
+        self.assertNotIn('X-Profile', response)
+        self.assertEqual([], profiling.list_profiles())
+
+
+    def test_staff_user_can_profile(self):
+        self.client.force_login(self.staff_user)
+        response = self.client.get(reverse('video_list') + '?profile=1')
+        self.assertEqual(200, response.status_code)
+        profiles = profiling.list_profiles()
+        self.assertEqual(1, len(profiles))
+        self.assertEqual(response['X-Profile'], profiles[0]['name'])
+        self.assertEqual('GET', profiles[0]['method'])
+
+
+    def test_anonymous_user_needs_signed_parameter(self):
+        self.client.get(reverse('video_list') + '?profile=1')
+        self.client.get(reverse('video_list') + '?profile=forged')
+        self.assertEqual([], profiling.list_profiles())
+
+        token = profiling.make_profile_token()
+        response = self.client.get(reverse('video_list') + '?profile=' + token)
+        self.assertIn('X-Profile', response)
+        self.assertEqual(1, len(profiling.list_profiles()))
+
+
+    def test_failed_save_does_not_break_request(self):
+        self.client.force_login(self.staff_user)
+        # a file where the directory should be, so the profile can't be written
+        not_a_dir = os.path.join(self.profile_dir, 'not_a_dir')
+        open(not_a_dir, 'w').close()
+        with override_settings(PROFILER_DIR=not_a_dir):
+            with self.assertLogs('video_collection.profiling', 'ERROR'):
+                response = self.client.get(reverse('video_list') + '?profile=1')
+        self.assertEqual(200, response.status_code)
+        self.assertNotIn('X-Profile', response)
+
+
+    def test_only_newest_profiles_kept(self):
+        self.client.force_login(self.staff_user)
+        names = [ self.client.get(reverse('home') + '?profile=1')['X-Profile'] for i in range(5) ]
+        kept = [ profile['name'] for profile in profiling.list_profiles() ]
+        self.assertEqual(list(reversed(names[2:])), kept)
+
+
+    def test_profiles_page_staff_only(self):
+        self.client.force_login(self.staff_user)
+        name = self.client.get(reverse('home') + '?profile=1')['X-Profile']
+
+        response = self.client.get(reverse('profiles'))
+        self.assertContains(response, '1 profile')
+        self.assertContains(response, reverse('profile_download', args=[name]))
+
+        response = self.client.get(reverse('profile_download', args=[name]))
+        self.assertEqual(200, response.status_code)
+        self.assertIn('attachment', response['Content-Disposition'])
+
+        self.assertEqual(404, self.client.get(reverse('profile_download', args=['..secret.prof'])).status_code)
+
+        self.client.logout()
+        response = self.client.get(reverse('profiles'))
+        self.assertEqual(302, response.status_code)  # off to the admin login
+
+
+    @override_settings(PROFILER_ENABLED=False)
+    def test_disabled_profiler_not_in_middleware(self):
+        self.client.force_login(self.staff_user)
+        response = self.client.get(reverse('video_list') + '?profile=1')
+        self.assertNotIn('X-Profile', response)
+        # Django leaves out middleware that raises this, so nothing runs per request
+        with self.assertRaises(MiddlewareNotUsed):
+            profiling.ProfilerMiddleware(lambda request: None)
+
+
+upstream_calls = []
+
+def fake_upstream(video_id):
+    # stands in for i.ytimg.com in the thumbnail tests
+    upstream_calls.append(video_id)
+    time.sleep(0.05)  # slow enough for concurrent requests to pile up
+    return thumbnails.PLACEHOLDER_GIF + video_id.encode()
+
+def failing_upstream(video_id):
+    upstream_calls.append(video_id)
+    raise thumbnails.ThumbnailError('nope')
+
+
+class TestThumbnails(TempDirSettingsMixin, TestCase):
+
+    def setUp(self):
+        self.use_temp_dir('THUMBNAIL_CACHE_DIR', THUMBNAIL_UPSTREAM='video_collection.tests.fake_upstream')
+        upstream_calls.clear()
+        thumbnails._failures.clear()
+        Video.objects.create(name='example', url='https://www.youtube.com/watch?v=IODxDxX7oi4')
+
+
+    def test_thumbnail_fetched_once_then_served_from_cache(self):
+        for i in range(2):
+            response = self.client.get(reverse('thumbnail', args=['IODxDxX7oi4']))
+            self.assertEqual(200, response.status_code)
+            self.assertEqual('image/gif', response['Content-Type'])
+            self.assertIn('max-age=31536000', response['Cache-Control'])
+            self.assertEqual(thumbnails.PLACEHOLDER_GIF + b'IODxDxX7oi4', b''.join(response.streaming_content))
+        self.assertEqual(['IODxDxX7oi4'], upstream_calls)
+
+
+    def test_matching_etag_not_modified(self):
+        etag = self.client.get(reverse('thumbnail', args=['IODxDxX7oi4']))['ETag']
+        response = self.client.get(reverse('thumbnail', args=['IODxDxX7oi4']), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(304, response.status_code)
+
+
+    def test_unknown_video_not_found(self):
+        response = self.client.get(reverse('thumbnail', args=['notavideo']))
+        self.assertEqual(404, response.status_code)
+        self.assertEqual([], upstream_calls)
+
+
+    def test_cache_hits_skip_database(self):
+        self.client.get(reverse('thumbnail', args=['IODxDxX7oi4']))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('thumbnail', args=['IODxDxX7oi4']))
+        self.assertEqual(200, response.status_code)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('thumbnail', args=['IODxDxX7oi4']), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(304, response.status_code)
+
+
+    @override_settings(THUMBNAIL_UPSTREAM='video_collection.tests.failing_upstream', THUMBNAIL_FAILURE_TTL=60)
+    def test_upstream_failure_bad_gateway_and_not_retried(self):
+        for i in range(3):
+            response = self.client.get(reverse('thumbnail', args=['IODxDxX7oi4']))
+            self.assertEqual(502, response.status_code)
+        self.assertEqual(['IODxDxX7oi4'], upstream_calls)
+
+
+    @override_settings(THUMBNAIL_UPSTREAM='video_collection.tests.failing_upstream', THUMBNAIL_FAILURE_TTL=0)
+    def test_upstream_failure_retried_after_ttl(self):
+        for i in range(2):
+            self.client.get(reverse('thumbnail', args=['IODxDxX7oi4']))
+        self.assertEqual(['IODxDxX7oi4', 'IODxDxX7oi4'], upstream_calls)
+
+
+    def test_youtube_upstream_quotes_video_id(self):
+        # Video.save takes ?v=a+b and stores the id 'a b'
+        Video.objects.create(name='spaces', url='https://www.youtube.com/watch?v=a+b')
+        with mock.patch('video_collection.thumbnails.urlopen', side_effect=OSError('offline')) as urlopen:
+            with self.assertRaises(thumbnails.ThumbnailError):
+                thumbnails.youtube_upstream('a b')
+        self.assertEqual('https://i.ytimg.com/vi/a%20b/hqdefault.jpg', urlopen.call_args[0][0])
+
+
+    @override_settings(THUMBNAIL_UPSTREAM='video_collection.thumbnails.youtube_upstream')
+    def test_youtube_upstream_bad_url_is_bad_gateway(self):
+        # http.client rejects the url with InvalidURL, a ValueError rather than an OSError
+        Video.objects.create(name='spaces', url='https://www.youtube.com/watch?v=a+b')
+        with mock.patch('video_collection.thumbnails.urlopen', side_effect=ValueError('bad url')) as urlopen:
+            for i in range(2):
+                response = self.client.get(reverse('thumbnail', args=['a b']))
+                self.assertEqual(502, response.status_code)
+        # the failure was remembered, not retried
+        self.assertEqual(1, urlopen.call_count)
+
+
+    def test_concurrent_requests_fetch_once(self):
+        def fetch():
+            thumbnails.get_thumbnail('abc').close()
+
+        threads = [ threading.Thread(target=fetch) for i in range(5) ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(['abc'], upstream_calls)
+
+
+    def test_least_recently_used_evicted(self):
+        size = len(fake_upstream('aaa'))
+        with override_settings(THUMBNAIL_CACHE_MAX_BYTES=size * 2):
+            for video_id in ['aaa', 'bbb']:
+                thumbnails.get_thumbnail(video_id).close()
+            # make bbb the oldest, then use aaa
+            os.utime(thumbnails.cache_path('bbb'), (0, 0))
+            thumbnails.get_thumbnail('aaa').close()
+            thumbnails.get_thumbnail('ccc').close()
+
+        self.assertTrue(os.path.exists(thumbnails.cache_path('aaa')))
+        self.assertFalse(os.path.exists(thumbnails.cache_path('bbb')))
+        self.assertTrue(os.path.exists(thumbnails.cache_path('ccc')))
+
+
+class TestTags(TestCase):
+
+    def setUp(self):
+        self.music = Tag.objects.create(name='music')
+        self.live = Tag.objects.create(name='live')
+        self.v1 = Video.objects.create(name='ABC', url='https://www.youtube.com/watch?v=123')
+        self.v2 = Video.objects.create(name='abc live', url='https://www.youtube.com/watch?v=456')
+        self.v3 = Video.objects.create(name='XYZ', url='https://www.youtube.com/watch?v=789')
+        self.v1.tags.add(self.music)
+        self.v2.tags.add(self.music, self.live)
+        self.v3.tags.add(self.live)
+
+
+    def assertCounts(self, music, live):
+        self.music.refresh_from_db()
+        self.live.refresh_from_db()
+        self.assertEqual((music, live), (self.music.video_count, self.live.video_count))
+
+
+    def test_counts_follow_tag_changes(self):
+        self.assertCounts(2, 2)
+
+        self.v1.tags.add(self.music)  # already there, no change
+        self.assertCounts(2, 2)
+
+        self.v2.tags.remove(self.live)
+        self.assertCounts(2, 1)
+
+        self.v2.tags.clear()
+        self.assertCounts(1, 1)
+
+        self.v3.tags.set([self.music])
+        self.assertCounts(2, 0)
+
+        self.v2.delete()
+        self.assertCounts(2, 0)
+
+
+    def test_counts_follow_changes_from_tag_side(self):
+        self.live.videos.add(self.v1)
+        self.assertCounts(2, 3)
+
+        self.music.videos.remove(self.v1)
+        self.assertCounts(1, 3)
+
+        self.live.videos.clear()
+        self.assertCounts(1, 0)
+
+
+    def test_counts_follow_bulk_video_delete(self):
+        Video.objects.filter(name__icontains='abc').delete()
+        self.assertCounts(0, 1)
+
+
+    def test_filter_all_tags(self):
+        response = self.client.get(reverse('video_list') + '?tags=music&tags=live')
+        self.assertEqual([self.v2], list(response.context['videos']))
+
+
+    def test_filter_any_tag(self):
+        response = self.client.get(reverse('video_list') + '?tags=music&tags=live&match=any')
+        self.assertEqual([self.v1, self.v2, self.v3], list(response.context['videos']))
+
+
+    def test_filter_tags_and_search_term(self):
+        response = self.client.get(reverse('video_list') + '?search_term=abc&tags=live')
+        self.assertEqual([self.v2], list(response.context['videos']))
+
+        response = self.client.get(reverse('video_list') + '?search_term=xyz&tags=music')
+        self.assertEqual([], list(response.context['videos']))
+        self.assertContains(response, 'No videos')
+
+
+    def test_unknown_tag_matches_nothing(self):
+        response = self.client.get(reverse('video_list') + '?search_term=abc&tags=doesnotexist')
+        self.assertEqual([], list(response.context['videos']))
+        self.assertContains(response, 'No videos')
+        # search term still in the form
+        self.assertEqual('abc', response.context['search_form'].cleaned_data['search_term'])
+
+        response = self.client.get(reverse('video_list') + '?tags=doesnotexist&tags=live&match=any')
+        self.assertEqual([self.v2, self.v3], list(response.context['videos']))
+
+
+    def test_bad_match_value_keeps_search(self):
+        response = self.client.get(reverse('video_list') + '?search_term=abc&tags=music&tags=live&match=bogus')
+        # falls back to all tags, and the form says what was wrong
+        self.assertEqual([self.v2], list(response.context['videos']))
+        self.assertIn('match', response.context['search_form'].errors)
+
+
+    def test_search_form_tags_without_counts_or_unused_tags(self):
+        Tag.objects.create(name='unused')
+        response = self.client.get(reverse('video_list') + '?match=any')
+        choices = list(response.context['search_form'].fields['tags'].choices)
+        self.assertEqual([('live', 'live'), ('music', 'music')], choices)
+        # counts are only in the sidebar
+        self.assertNotContains(response, 'music (2)')
+        self.assertNotContains(response, 'unused')
+
+
+    def test_tags_and_sidebar_shown(self):
+        response = self.client.get(reverse('video_list') + '?match=any')
+        self.assertContains(response, '?tags=music">music</a> (2)')
+        self.assertContains(response, '?tags=live">live</a> (2)')
+        self.assertEqual(['live', 'music'], [ tag.name for tag in response.context['tag_sidebar'] ])
+
+
+    def test_query_count_does_not_grow_with_videos(self):
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(reverse('video_list') + '?match=any')
+            return len(queries)
+
+        few_videos = count_queries()
+        for i in range(10):
+            video = Video.objects.create(name=f'more {i}', url=f'https://www.youtube.com/watch?v=more{i}')
+            video.tags.add(self.music, self.live)
+        self.assertEqual(few_videos, count_queries())
+
+
+    def test_add_video_with_tags(self):
+        new_video = {
+            'name': 'tagged',
+            'url': 'https://www.youtube.com/watch?v=aGCdLKXNF3w',
+            'tags': [self.music.pk],
+        }
+        self.client.post(reverse('add_video'), data=new_video)
+        video = Video.objects.get(name='tagged')
+        self.assertEqual([self.music], list(video.tags.all()))
+        self.assertCounts(3, 2)
+
+
+    @override_settings(VIDEO_SNAPSHOT_DIR=None)
+    def test_added_event_has_tags_from_add_form(self):
+        new_video = {
+            'name': 'tagged',
+            'url': 'https://www.youtube.com/watch?v=aGCdLKXNF3w',
+            'tags': [self.music.pk, self.live.pk],
+        }
+        with mock.patch.object(events.broadcaster, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(reverse('add_video'), data=new_video)
+        event, data = publish.call_args[0]
+        self.assertEqual('added', event)
+        self.assertCountEqual(['music', 'live'], data['tags'])
@@ -0,0 +1,187 @@
+import io
+import os
+import threading
+import time
+from urllib.parse import quote
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .files import write_atomic
+
+try:
+    from PIL import Image
+except ImportError:
+    # Pillow is optional, without it thumbnails are cached at their original size
+    Image = None
+
+# Local copies of the YouTube thumbnails, so browsers don't all go off to
+# i.ytimg.com and we control the caching. Images are fetched from the upstream
+# named in THUMBNAIL_UPSTREAM, resized, and kept on disk. The cache directory is
+# held under THUMBNAIL_CACHE_MAX_BYTES by deleting the least recently used files,
+# every hit bumps the file's mtime so it counts as recently used. Failed fetches are
+# remembered for THUMBNAIL_FAILURE_TTL seconds so they aren't retried on every request.
+
+YOUTUBE_THUMBNAIL_URL = 'https://i.ytimg.com/vi/{video_id}/hqdefault.jpg'
+
+# smallest possible gif, 1x1 transparent pixel
+PLACEHOLDER_GIF = (
+    b'GIF89a\x01\x00\x01\x00\x80\x00\x00\x00\x00\x00\xff\xff\xff!\xf9\x04\x01\x00\x00\x00\x00'
+    b',\x00\x00\x00\x00\x01\x00\x01\x00\x00\x02\x02D\x01\x00;'
+)
+
+IMAGE_TYPES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG', 'image/png'),
+    (b'GIF8', 'image/gif'),
+]
+
+_fetch_locks = {}
+_fetch_locks_lock = threading.Lock()
+
+# video_id -> when to try upstream again, for thumbnails that failed to fetch
+_failures = {}
+_failures_lock = threading.Lock()
+
+
+class ThumbnailError(Exception):
+    pass
+
+
+def youtube_upstream(video_id):
+    # video ids come from whatever was in ?v=, which can include spaces and the like
+    url = YOUTUBE_THUMBNAIL_URL.format(video_id=quote(video_id, safe=''))
+    try:
+        with urlopen(url, timeout=10) as response:
+            return response.read()
+    except (OSError, ValueError) as err:
+        # urllib's URLError and HTTPError are both OSErrors, so are timeouts.
+        # a url http.client still won't take raises InvalidURL, a ValueError
+        raise ThumbnailError(f'Could not fetch thumbnail for {video_id}') from err
+
+
+def placeholder_upstream(video_id):
+    # for working offline, point THUMBNAIL_UPSTREAM here
+    return PLACEHOLDER_GIF
+
+
+def cache_dir():
+    return settings.THUMBNAIL_CACHE_DIR
+
+
+def cache_path(video_id):
+    return os.path.join(cache_dir(), f'{video_id}.img')
+
+
+def resize(image_bytes):
+    if Image is None:
+        return image_bytes
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            width = settings.THUMBNAIL_WIDTH
+            if image.width <= width:
+                return image_bytes
+            height = round(image.height * width / image.width)
+            output = io.BytesIO()
+            image.convert('RGB').resize((width, height)).save(output, 'JPEG', quality=85)
+            return output.getvalue()
+    except OSError:
+        # not an image Pillow understands, keep it as it is
+        return image_bytes
+
+
+def evict():
+    # delete least recently used thumbnails until the cache fits in the budget
+    try:
+        entries = [ entry for entry in os.scandir(cache_dir()) if entry.name.endswith('.img') ]
+    except FileNotFoundError:
+        return
+    files = []
+    for entry in entries:
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in files)
+    for _, size, path in sorted(files):
+        if total <= settings.THUMBNAIL_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def image_content_type(image_file):
+    start = image_file.read(12)
+    image_file.seek(0)
+    for magic, content_type in IMAGE_TYPES:
+        if start.startswith(magic):
+            return content_type
+    if start[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'application/octet-stream'
+
+
+def open_cached(video_id):
+    # the cached thumbnail as an open file, or None. An open file keeps working
+    # even if eviction deletes it a moment later
+    path = cache_path(video_id)
+    try:
+        image_file = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+    return image_file
+
+
+def _recently_failed(video_id):
+    with _failures_lock:
+        expires = _failures.get(video_id)
+        if expires is None:
+            return False
+        if expires > time.monotonic():
+            return True
+        del _failures[video_id]
+        return False
+
+
+def get_thumbnail(video_id):
+    # returns the cached thumbnail as an open file, fetching it first if needed
+    image_file = open_cached(video_id)
+    if image_file:
+        return image_file
+
+    # only one request fetches a given thumbnail, the rest wait for it and use the file
+    with _fetch_locks_lock:
+        lock = _fetch_locks.setdefault(video_id, threading.Lock())
+    with lock:
+        try:
+            image_file = open_cached(video_id)
+            if image_file:
+                return image_file
+            # don't make every request wait on an upstream that just failed
+            if _recently_failed(video_id):
+                raise ThumbnailError(f'Thumbnail for {video_id} failed recently')
+            upstream = import_string(settings.THUMBNAIL_UPSTREAM)
+            try:
+                image_bytes = upstream(video_id)
+            except ThumbnailError:
+                with _failures_lock:
+                    _failures[video_id] = time.monotonic() + settings.THUMBNAIL_FAILURE_TTL
+                raise
+            write_atomic(cache_path(video_id), resize(image_bytes))
+            image_file = open(cache_path(video_id), 'rb')
+        finally:
+            with _fetch_locks_lock:
+                if _fetch_locks.get(video_id) is lock:
+                    del _fetch_locks[video_id]
+    evict()
+    return image_file
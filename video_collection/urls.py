@@ -4,5 +4,8 @@ from . import views
 urlpatterns = [
     path('', views.home, name='home'),
     path('add', views.add, name='add_video'),
-    path('video_list', views.video_list, name='video_list')
+    path('video_list', views.video_list, name='video_list'),
+    path('video_list.json', views.video_list_json, name='video_list_json'),
+    path('video_list/events', views.video_events, name='video_events'),
+    path('thumbnail/<str:video_id>', views.thumbnail, name='thumbnail')
 ]
@@ -1,10 +1,17 @@
 from django.shortcuts import render, redirect
+from django.conf import settings
 from .models import Video
 from .forms import VideoForm, SearchForm
 from django.contrib import messages
 from django.core.exceptions import ValidationError
-from django.db import IntegrityError
+from django.db import IntegrityError, transaction
 from django.db.models.functions import Lower
+from django.http import FileResponse, Http404, HttpResponse, JsonResponse
+from django.contrib.admin.views.decorators import staff_member_required
+from django.urls import reverse
+import os
+from . import profiling, snapshot, thumbnails
+from .tags import tag_sidebar
 
 # Create your views here.
 
@@ -22,7 +29,10 @@ def add(request):
         new_video_form = VideoForm(request.POST)
         if new_video_form.is_valid():
             try:
-                new_video_form.save()
+                # video and its tags saved together, and a failed save gets rolled back
+                # so the page can still query the database afterwards
+                with transaction.atomic():
+                    new_video_form.save()
                 return redirect('video_list')
             except ValidationError:
                 messages.warning(request, 'Invalid YouTube URL')
@@ -37,19 +47,92 @@ def add(request):
     return render(request, 'video_collection/add.html', {'new_video_form': new_video_form})
 
 def video_list(request):
+    # plain list for someone not logged in is the same for everyone, so serve the
+    # pre-rendered file if there is a fresh one
+    if not request.GET and not request.user.is_authenticated:
+        response = snapshot.serve_snapshot(snapshot.LIST_PAGE)
+        if response is not None:
+            return response
+
     # getting the form...
     search_form = SearchForm(request.GET)
-    # initially not valid cause not entered.. so down to the bottom
-    if search_form.is_valid():
-        # then back here, once they click submit again, it takes the search term and cleans it?
-        # I have to read up more on that function.
-        # then uses it to find the video objects in the database. this is django's ORM I think?
-        search_term = search_form.cleaned_data['search_term']
-        videos = Video.objects.filter(name__icontains=search_term).order_by(Lower('name'))
+    videos = Video.objects.order_by(Lower('name'))
+    # is_valid() fills in cleaned_data for every field that was ok, so one bad value
+    # (like ?match=whatever) doesn't throw away the rest of the search. The form
+    # shows the error for that field
+    search_form.is_valid()
+    # then it takes the search term and cleans it, and uses it to find the
+    # video objects in the database. this is django's ORM I think?
+    search_term = search_form.cleaned_data.get('search_term')
+    if search_term:
+        videos = videos.filter(name__icontains=search_term)
 
-    else:
-        search_form = SearchForm()
-        videos = Video.objects.order_by(Lower('name'))
+    tag_names = search_form.cleaned_data.get('tags')
+    if tag_names:
+        if search_form.cleaned_data.get('match') == 'any':
+            videos = videos.filter(tags__name__in=tag_names).distinct()
+        else:
+            # one join per tag, a video has to have every one of them
+            for tag_name in tag_names:
+                videos = videos.filter(tags__name=tag_name)
+
+    # all the tags for the page in one query instead of one per video
+    videos = videos.prefetch_related('tags')
     # so the page returns the render for the search form and videos to the page..
-    return render(request, 'video_collection/video_list.html', {'videos': videos, 'search_form': search_form})
+    return render(request, 'video_collection/video_list.html',
+        {'videos': videos, 'search_form': search_form, 'tag_sidebar': tag_sidebar()})
+
+def video_list_json(request):
+    response = snapshot.serve_snapshot(snapshot.LIST_JSON)
+    if response is not None:
+        return response
+    videos = Video.objects.order_by(Lower('name')).prefetch_related('tags')
+    return JsonResponse({'videos': [snapshot.video_to_dict(video) for video in videos]})
+
+def video_events(request):
+    # the real event stream is served by video/asgi.py, this only gets hit when running
+    # under WSGI (like runserver). 204 tells the browser's EventSource to stop retrying
+    return HttpResponse(status=204)
 
+@staff_member_required
+def profiles(request):
+    # signed links so someone without a staff login can profile a request too
+    token = profiling.make_profile_token()
+    profile_links = [ f'{reverse(name)}?{profiling.PROFILE_PARAMETER}={token}' for name in ('video_list', 'add_video') ]
+    return render(request, 'video_collection/profiles.html', {
+        'profiles': profiling.list_profiles(),
+        'profile_links': profile_links,
+        'profiler_enabled': getattr(settings, 'PROFILER_ENABLED', False),
+    })
+
+@staff_member_required
+def profile_download(request, name):
+    # only names the profiler could have written, so nobody can ask for ../../something
+    if not profiling.PROFILE_NAME.match(name):
+        raise Http404
+    try:
+        profile_file = open(os.path.join(profiling.profile_dir(), name), 'rb')
+    except FileNotFoundError:
+        raise Http404
+    return FileResponse(profile_file, as_attachment=True, content_type='application/octet-stream')
+
+def thumbnail(request, video_id):
+    # a video's thumbnail doesn't change, so the id (and size) is enough for the etag
+    etag = f'"{video_id}-{settings.THUMBNAIL_WIDTH}"'
+    if request.headers.get('If-None-Match') == etag:
+        response = HttpResponse(status=304)
+    else:
+        # cache hits never touch the database
+        image_file = thumbnails.open_cached(video_id)
+        if image_file is None:
+            # only fetch thumbnails for videos in the collection, this isn't a general purpose proxy
+            if not Video.objects.filter(video_id=video_id).exists():
+                raise Http404
+            try:
+                image_file = thumbnails.get_thumbnail(video_id)
+            except thumbnails.ThumbnailError:
+                return HttpResponse('Thumbnail not available', status=502)
+        response = FileResponse(image_file, content_type=thumbnails.image_content_type(image_file))
+    response['ETag'] = etag
+    response['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response